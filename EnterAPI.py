@@ -1,35 +1,48 @@
-import os
+import sys
+from pathlib import Path
 from dotenv import load_dotenv
 
-def write_env_variable(file_path, key, value):
-    """Write or update a key-value pair in the .env file."""
+def write_env_variables(file_path, updates):
+    """Write or update multiple key-value pairs in the .env file with one read and one write.
+
+    Comments, blank lines and anything else that isn't a KEY=value pair are
+    carried through the rewrite untouched, in their original order.
+    """
+    path = Path(file_path)
     lines = []
-    found = False
-
-    if os.path.exists(file_path):
-        with open(file_path, "r") as f:
-            for line in f:
-                if line.startswith(f"{key}="):
-                    lines.append(f"{key}={value}\n")
-                    found = True
-                else:
-                    lines.append(line)
-    if not found:
-        lines.append(f"{key}={value}\n")
-
-    with open(file_path, "w") as f:
-        f.writelines(lines)
+    positions = {}
+
+    if path.exists():
+        for line in path.read_text().splitlines():
+            key, sep, value = line.partition("=")
+            if sep and key and not key.startswith("#"):
+                positions[key] = len(lines)
+            lines.append(line)
+
+    for key, value in updates.items():
+        if key in positions:
+            lines[positions[key]] = f"{key}={value}"
+        else:
+            lines.append(f"{key}={value}")
+
+    path.write_text("".join(f"{line}\n" for line in lines))
 
 def main():
-    print("🔐 Save your API keys securely into a .env file\n")
+    # Scripted setup: `python EnterAPI.py <hf_key> <gemini_key>` skips the prompts
+    if len(sys.argv) == 3:
+        hf_key, gemini_key = sys.argv[1].strip(), sys.argv[2].strip()
+    else:
+        print("🔐 Save your API keys securely into a .env file\n")
 
-    hf_key = input("Enter your Hugging Face API key: ").strip()
-    gemini_key = input("Enter your Gemini API key: ").strip()
+        hf_key = input("Enter your Hugging Face API key: ").strip()
+        gemini_key = input("Enter your Gemini API key: ").strip()
 
     env_path = ".env"
 
-    write_env_variable(env_path, "HUGGINGFACE_API_KEY", hf_key)
-    write_env_variable(env_path, "GEMINI_API_KEY", gemini_key)
+    write_env_variables(env_path, {
+        "HUGGINGFACE_API_KEY": hf_key,
+        "GEMINI_API_KEY": gemini_key,
+    })
 
     print(f"\n✅ Keys saved successfully in {env_path}")
 
@@ -1,6 +1,20 @@
 import streamlit as st
 import requests
+from urllib3.util.retry import Retry
 import json
+import ast
+import hashlib
+import io
+
+# orjson decodes the multi-KB Gemini payloads 2-3x faster than stdlib json;
+# fall back transparently when it isn't installed
+try:
+    import orjson
+
+    def _json_loads(data):
+        return orjson.loads(data)
+except ImportError:
+    _json_loads = json.loads
 import re
 import os
 from typing import Dict, List, Tuple, Optional
@@ -25,6 +39,276 @@ if not gemini_api_key:
     st.stop()
 
 
+# ---------------------------------------------------------------------------
+# Pre-compiled patterns — compiled once at import so the per-line hot loops
+# below don't re-parse pattern strings or churn re's internal cache
+# ---------------------------------------------------------------------------
+
+# Lines that start a new logical block in split_code_into_functions
+_BLOCK_BOUNDARY_RES = tuple(re.compile(p) for p in (
+    r'^\s*def\s+(\w+)',  # Python
+    r'^\s*class\s+(\w+)',  # Python, Java, C#
+    r'^\s*function\s+(\w+)',  # JavaScript
+    r'^\s*public\s+class\s+(\w+)',  # Java, C#
+    r'^\s*public\s+static\s+\w+\s+(\w+)',  # Java, C#
+    r'^\s*namespace\s+(\w+)',  # C#
+    r'^\s*using\s+System',  # C#
+    r'^\s*package\s+[\w.]+',  # Java
+    r'^\s*func\s+(\w+)',  # Go, Swift
+    r'^\s*fn\s+(\w+)',  # Rust
+))
+
+# Fused single-pass dispatch for the rule-based explainer — one match per line
+# with named groups instead of ~30 sequential pattern attempts
+# Applied to already-stripped lines, so no leading-whitespace prefix is needed
+_FEATURE_DISPATCH_RE = re.compile(
+    r'(?P<function>(?:def|function|func|fn)\s+(\w+))'
+    r'|(?P<class>(?:public\s+)?class\s+(\w+))'
+    r'|(?P<variable>(?:let\s+|var\s+|const\s+)?(\w+)\s*=)'
+    r'|(?P<conditional>(?:if\s+|elif\s+|else\s*:|switch\s+))'
+    r'|(?P<loop>(?:for\s+|while\s+|foreach\s+))'
+    r'|(?P<error_handling>(?:try\s*:|catch|except|finally))'
+    r'|(?P<return>return\s+)'
+    r'|(?P<import>(?:import\s+|from\s+.*import|using\s+|#include))'
+    r'|(?P<output>(?:print\s*\(|console\.log|Console\.WriteLine|println!))'
+)
+
+_FEATURE_MESSAGES = {
+    'conditional': "**Conditional Logic**: Contains conditional statement for decision making",
+    'loop': "**Loop Structure**: Uses loop for iteration",
+    'error_handling': "**Error Handling**: Implements error handling mechanism",
+    'return': "**Return Statement**: Returns value from function",
+    'import': "**Module Import**: Imports external libraries/modules",
+    'output': "**Output**: Displays information to console",
+}
+
+# Fixed-prefix features resolved with C-level str.startswith before the regex
+# runs; the regex is only needed when there's an identifier to extract
+_FEATURE_PREFIXES = (
+    (('if ', 'elif ', 'else:', 'else :', 'switch '), 'conditional'),
+    (('for ', 'while ', 'foreach '), 'loop'),
+    (('try:', 'try :', 'catch', 'except', 'finally'), 'error_handling'),
+    (('return ',), 'return'),
+    (('import ', 'from ', 'using ', '#include'), 'import'),
+    (('print(', 'print (', 'console.log', 'Console.WriteLine', 'println!'), 'output'),
+)
+
+
+class _TokenBucket:
+    """Client-side rate limiter sized to the Gemini free tier (~15 req/min).
+
+    acquire() sleeps only when the bucket is actually empty, unlike the
+    pessimistic fixed sleep it replaces, and admits short bursts up to
+    capacity. Server-side 429s are still retried with Retry-After honored
+    by the urllib3 Retry adapter on the session.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            wait = max(0.0, (1 - self.tokens) / self.rate)
+            self.tokens -= 1
+        if wait > 0:
+            time.sleep(wait)
+
+
+_BUCKET = _TokenBucket(rate=15 / 60.0, capacity=15)
+
+
+# First-token dispatch for the rule-based comment generator — a dict lookup
+# on the leading keyword replaces the regex cascade; only def/class/assignment
+# lines still need a (precompiled) pattern to pull the identifier out
+_DEF_NAME_RE = re.compile(r'def\s+(\w+)')
+_CLASS_NAME_RE = re.compile(r'class\s+(\w+)')
+_ASSIGN_NAME_RE = re.compile(r'(\w+)\s*=')
+
+_KEYWORD_COMMENTS = {
+    'if': "Check condition",
+    'elif': "Check alternative condition",
+    'else:': "Handle remaining cases",
+    'for': "Start loop iteration",
+    'while': "Start conditional loop",
+    'try:': "Begin error handling",
+    'except': "Handle errors",
+    'except:': "Handle errors",
+    'finally:': "Cleanup operations",
+    'return': "Return result",
+    'import': "Import module",
+    'from': "Import specific items",
+}
+
+
+# Expanded per-language patterns for the fallback detector (compiled once,
+# multiline + case-insensitive to match the original findall semantics)
+_LANGUAGE_PATTERNS = {
+    lang: tuple(re.compile(p, re.MULTILINE | re.IGNORECASE) for p in patterns)
+    for lang, patterns in {
+    'python': [
+        r'\bdef\s+\w+\s*\(', r'\bimport\s+\w+', r'\bfrom\s+\w+\s+import\b',
+        r'\bprint\s*\(', r'\bif\s+.*:', r'\bfor\s+.*:', r'\bwhile\s+.*:',
+        r'\btry\s*:', r'\bclass\s+\w+.*:', r'\bwith\s+.*:', r'\bexcept\s*.*:',
+        r'\belif\s+.*:', r'\bpass\b', r'\bNone\b', r'\bTrue\b', r'\bFalse\b'
+    ],
+    'javascript': [
+        r'\bfunction\s+\w+\s*\(', r'\bconst\s+\w+', r'\blet\s+\w+', r'\bvar\s+\w+',
+        r'=>', r'\bconsole\.log\b', r'\bdocument\b', r'\bwindow\b',
+        r'\breturn\b', r'{\s*$', r'}\s*$', r'\bnew\s+\w+', r'\bthis\.',
+        r'\bfunction\s*\(', r'\b(null|undefined)\b'
+    ],
+    'typescript': [
+        r'\binterface\s+\w+', r'\btype\s+\w+\s*=', r':\s*(string|number|boolean)',
+        r'\bexport\s+interface', r'\bimport\s+.*\bfrom\b', r'<.*>',
+        r'\bgeneric\b', r'\bnamespace\s+\w+'
+    ],
+    'java': [
+        r'\bpublic\s+class\s+\w+', r'\bpublic\s+static\s+void\s+main',
+        r'\bprivate\s+\w+', r'\bprotected\s+\w+', r'\bSystem\.out\.println',
+        r'\bvoid\s+\w+\s*\(', r'\bString\s+\w+', r'\bint\s+\w+', r'\bboolean\s+\w+',
+        r'\bpublic\s+\w+\s+\w+\s*\(', r'\bthrows\s+\w+', r'\bextends\s+\w+',
+        r'\bimplements\s+\w+', r'\bpackage\s+[\w.]+;'
+    ],
+    'csharp': [
+        r'\busing\s+System', r'\bnamespace\s+\w+', r'\bpublic\s+class\s+\w+',
+        r'\bpublic\s+static\s+void\s+Main', r'\bConsole\.WriteLine',
+        r'\bprivate\s+\w+', r'\bpublic\s+\w+', r'\bprotected\s+\w+',
+        r'\bstring\s+\w+', r'\bint\s+\w+', r'\bbool\s+\w+', r'\bvar\s+\w+\s*=',
+        r'\bnew\s+\w+\s*\(', r'\bget\s*;', r'\bset\s*;', r'\bthis\.',
+        r'\boverride\s+\w+', r'\bvirtual\s+\w+', r'\babstract\s+\w+'
+    ],
+    'cpp': [
+        r'\b#include\s*<.*>', r'\bstd::', r'\bint\s+main\s*\(',
+        r'\bcout\s*<<', r'\bcin\s*>>', r'\bnamespace\s+\w+',
+        r'\busing\s+namespace\s+std', r'\bclass\s+\w+', r'\bpublic\s*:',
+        r'\bprivate\s*:', r'\bprotected\s*:', r'\bvirtual\s+\w+',
+        r'\btemplate\s*<.*>', r'\btypedef\s+\w+'
+    ],
+    'go': [
+        r'\bpackage\s+main', r'\bfunc\s+main\s*\(\)', r'\bfunc\s+\w+\s*\(',
+        r'\bimport\s+\(', r'\bfmt\.Print', r'\bvar\s+\w+\s+\w+',
+        r'\btype\s+\w+\s+struct', r'\bgo\s+\w+\s*\(', r'\bchan\s+\w+',
+        r'\brange\s+\w+', r'\bdefer\s+\w+', r'\binterface\s*{'
+    ],
+    'rust': [
+        r'\bfn\s+main\s*\(\)', r'\bfn\s+\w+\s*\(', r'\blet\s+\w+',
+        r'\blet\s+mut\s+\w+', r'\bprintln!\s*\(', r'\buse\s+\w+',
+        r'\bstruct\s+\w+', r'\bimpl\s+\w+', r'\btrait\s+\w+',
+        r'\bmatch\s+\w+', r'\bSome\s*\(', r'\bNone\b', r'\bResult\s*<'
+    ],
+    'php': [
+        r'<\?php', r'\$\w+', r'\becho\s+', r'\bprint\s+',
+        r'\bfunction\s+\w+\s*\(', r'\bclass\s+\w+', r'\bpublic\s+function',
+        r'\bprivate\s+function', r'\bprotected\s+function', r'\bextends\s+\w+',
+        r'\bimplements\s+\w+', r'\bnew\s+\w+\s*\('
+    ],
+    'ruby': [
+        r'\bdef\s+\w+', r'\bclass\s+\w+', r'\bmodule\s+\w+',
+        r'\bputs\s+', r'\bprint\s+', r'\bbegin\b', r'\brescue\b',
+        r'\bensure\b', r'\bend\b', r'\bif\s+.*\bthen\b', r'\bunless\s+',
+        r'\bcase\s+', r'\bwhen\s+', r'@\w+', r'@@\w+'
+    ],
+    'kotlin': [
+        r'\bfun\s+main\s*\(', r'\bfun\s+\w+\s*\(', r'\bval\s+\w+',
+        r'\bvar\s+\w+', r'\bclass\s+\w+', r'\bobject\s+\w+',
+        r'\bdata\s+class', r'\bsealed\s+class', r'\bwhen\s*\(',
+        r'\bprintln\s*\(', r'\bcompanion\s+object'
+    ],
+    'swift': [
+        r'\bfunc\s+\w+\s*\(', r'\bvar\s+\w+\s*:', r'\blet\s+\w+\s*:',
+        r'\bclass\s+\w+', r'\bstruct\s+\w+', r'\benum\s+\w+',
+        r'\bprotocol\s+\w+', r'\bextension\s+\w+', r'\bprint\s*\(',
+        r'\bif\s+let\s+', r'\bguard\s+let', r'\bswitch\s+\w+'
+    ],
+    'scala': [
+        r'\bobject\s+\w+', r'\bdef\s+main\s*\(', r'\bdef\s+\w+\s*\(',
+        r'\bval\s+\w+', r'\bvar\s+\w+', r'\bclass\s+\w+', r'\btrait\s+\w+',
+        r'\bcase\s+class', r'\bcase\s+object', r'\bmatch\s*\{',
+        r'\bprintln\s*\(', r'\bimport\s+scala'
+    ],
+    'dart': [
+        r'\bvoid\s+main\s*\(', r'\bclass\s+\w+', r'\bString\s+\w+',
+        r'\bint\s+\w+', r'\bdouble\s+\w+', r'\bbool\s+\w+',
+        r'\bprint\s*\(', r'\bfinal\s+\w+', r'\bconst\s+\w+',
+        r'\bextends\s+\w+', r'\bimplements\s+\w+', r'\basync\s+\w+'
+    ],
+    'r': [
+        r'\blibrary\s*\(', r'\brequire\s*\(', r'\bfunction\s*\(',
+        r'\bdata\.frame\s*\(', r'\bc\s*\(', r'\blist\s*\(',
+        r'\bggplot\s*\(', r'\baes\s*\(', r'\bsummary\s*\(',
+        r'<-', r'\bprint\s*\(', r'\bcat\s*\('
+    ],
+    'matlab': [
+        r'\bfunction\s+.*=\s*\w+\s*\(', r'\bend\s*$', r'\bdisp\s*\(',
+        r'\bfprintf\s*\(', r'\bplot\s*\(', r'\bfigure\s*\(',
+        r'\bhold\s+on', r'\bhold\s+off', r'%.*$', r'\bclc\b', r'\bclear\b'
+    ],
+    'sql': [
+        r'\bSELECT\s+.*\bFROM\b', r'\bINSERT\s+INTO\b', r'\bUPDATE\s+.*\bSET\b',
+        r'\bDELETE\s+FROM\b', r'\bCREATE\s+TABLE\b', r'\bDROP\s+TABLE\b',
+        r'\bALTER\s+TABLE\b', r'\bWHERE\s+', r'\bORDER\s+BY\b',
+        r'\bGROUP\s+BY\b', r'\bHAVING\s+', r'\bJOIN\s+.*\bON\b'
+    ],
+    'html': [
+        r'<!DOCTYPE\s+html>', r'<html.*>', r'<head.*>', r'<body.*>',
+        r'<div.*>', r'<span.*>', r'<p.*>', r'<a\s+href=',
+        r'<img\s+src=', r'<script.*>', r'<style.*>', r'<link.*>'
+    ],
+    'css': [
+        r'[\w-]+\s*\{', r'[\w-]+\s*:\s*[^;]+;', r'@import\s+',
+        r'@media\s+', r'@keyframes\s+', r'#[\w-]+\s*\{',
+        r'\.[\w-]+\s*\{', r'color\s*:', r'background\s*:',
+        r'margin\s*:', r'padding\s*:', r'font-size\s*:'
+    ],
+    'bash': [
+        r'#!/bin/bash', r'#!/bin/sh', r'\becho\s+', r'\bif\s+\[',
+        r'\bfi\b', r'\bfor\s+\w+\s+in\b', r'\bdone\b', r'\bwhile\s+\[',
+        r'\bfunction\s+\w+\s*\(', r'\$\w+', r'\$\{.*\}', r'\bexport\s+'
+    ],
+    'powershell': [
+        r'\$\w+', r'\bWrite-Host\b', r'\bGet-\w+', r'\bSet-\w+',
+        r'\bNew-\w+', r'\bRemove-\w+', r'\bInvoke-\w+', r'\bTest-\w+',
+        r'\bif\s*\(.*\)\s*\{', r'\bforeach\s*\(', r'\bparam\s*\(',
+        r'\bfunction\s+\w+\s*\{', r'\[string\]', r'\[int\]'
+    ],
+    'yaml': [
+        r'^\s*\w+\s*:', r'^\s*-\s+\w+', r'---\s*$', r'^\s*#.*',
+        r'^\s*\w+\s*:\s*\|', r'^\s*\w+\s*:\s*>', r'^\s*\w+\s*:\s*\[',
+        r'version\s*:', r'apiVersion\s*:', r'kind\s*:'
+    ],
+    'json': [
+        r'^\s*\{', r'^\s*\[', r'"\w+"\s*:\s*', r'"\w+"\s*:\s*"',
+        r'"\w+"\s*:\s*\d+', r'"\w+"\s*:\s*true', r'"\w+"\s*:\s*false',
+        r'"\w+"\s*:\s*null', r'^\s*\}', r'^\s*\]'
+    ],
+    'xml': [
+        r'<\?xml\s+version=', r'<\w+.*?>', r'</\w+>', r'<\w+\s+.*?/>',
+        r'<!\[CDATA\[', r'<!--.*?-->', r'<!\s*DOCTYPE\s+',
+        r'xmlns\s*=', r'<\w+:\w+.*?>'
+    ]
+}.items()
+}
+
+
+# Unambiguous language signatures — a hit on any of these skips the full
+# per-language scoring scan entirely
+_SIGNATURES = (
+    (re.compile(r'^<!DOCTYPE\s+html', re.IGNORECASE | re.MULTILINE), 'html'),
+    (re.compile(r'^#!/bin/(?:ba)?sh'), 'bash'),
+    (re.compile(r'^<\?xml'), 'xml'),
+    (re.compile(r'^<\?php', re.MULTILINE), 'php'),
+    (re.compile(r'^\s*package\s+main\s*$', re.MULTILINE), 'go'),
+    (re.compile(r'^\s*using\s+System\s*;', re.MULTILINE), 'csharp'),
+    (re.compile(r'^\s*#include\s*<', re.MULTILINE), 'cpp'),
+)
+
 
 class GeminiCodeExplainer:
     def __init__(self):
@@ -32,241 +316,156 @@ class GeminiCodeExplainer:
         
 
         self.base_url = "https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash-latest:generateContent"
+        self.stream_url = "https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash-latest:streamGenerateContent"
         self.api_key = gemini_api_key
 
         if not self.api_key:
             st.error("GEMINI_API_KEY not found in environment variables!")
             st.stop()
+
+        # Reuse one session for all Gemini calls — keep-alive avoids a fresh
+        # TCP+TLS handshake per request. Transient 429/5xx responses are
+        # retried with exponential backoff (Retry-After is honored) instead of
+        # immediately dropping to the rule-based fallback.
+        self.session = requests.Session()
+        self.session.headers.update({"Content-Type": "application/json"})
+        retry = Retry(
+            total=3,
+            backoff_factor=0.3,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset(["POST"]),
+        )
+        adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=retry)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
     
-    def query_gemini(self, prompt: str, max_tokens: int = 1000) -> str:
-        """Query Gemini API with a prompt"""
-        try:
-            headers = {
-                "Content-Type": "application/json",
-            }
-            
-            payload = {
-                "contents": [{
-                    "parts": [{
-                        "text": prompt
-                    }]
-                }],
-                "generationConfig": {
-                    "temperature": 0.3,
-                    "topK": 40,
-                    "topP": 0.95,
-                    "maxOutputTokens": max_tokens,
-                    "stopSequences": []
-                }
+    def query_gemini_stream(self, prompt: str, max_tokens: int = 1000, response_mime_type: str = None):
+        """Stream a Gemini response as text chunks via the SSE endpoint.
+
+        Tokens are yielded as they arrive instead of blocking until the full
+        generation finishes; callers needing the complete text use query_gemini.
+        """
+        payload = {
+            "contents": [{
+                "parts": [{
+                    "text": prompt
+                }]
+            }],
+            "generationConfig": {
+                "temperature": 0.3,
+                "topK": 40,
+                "topP": 0.95,
+                "maxOutputTokens": max_tokens,
+                "stopSequences": []
             }
-            
-            response = requests.post(
-                f"{self.base_url}?key={self.api_key}",
-                headers=headers,
-                json=payload,
-                timeout=60
-            )
-            
-            if response.status_code == 200:
-                result = response.json()
-                if 'candidates' in result and len(result['candidates']) > 0:
-                    return result['candidates'][0]['content']['parts'][0]['text'].strip()
-                else:
-                    return "No response generated"
-            else:
-                return f"Error: HTTP {response.status_code} - {response.text}"
-                
-        except Exception as e:
-            return f"Error querying Gemini: {str(e)}"
-    
-    def detect_language(self, code: str) -> str:
-        """Enhanced language detection"""
-        # Python patterns
-        python_patterns = [
-            r'\bdef\b', r'\bimport\b', r'\bfrom\b.*\bimport\b', r'\bprint\s*\(',
-            r'\bif\s+.*:', r'\bfor\s+.*:', r'\bwhile\s+.*:', r'\btry\s*:',
-            r'\bclass\s+\w+.*:', r'\bwith\s+.*:', r'\bexcept\s*.*:'
-        ]
-        
-        # JavaScript patterns
-        js_patterns = [
-            r'\bfunction\b', r'\bconst\b', r'\blet\b', r'\bvar\b', r'=>',
-            r'\bconsole\.log\b', r'\bdocument\b', r'\bwindow\b', r'\breturn\b',
-            r'{\s*$', r'}\s*$'
-        ]
-        
-        # Java patterns
-        java_patterns = [
-            r'\bpublic\s+class\b', r'\bpublic\s+static\b', r'\bprivate\b',
-            r'\bprotected\b', r'\bSystem\.out\.println\b', r'\bvoid\b',
-            r'\bString\b', r'\bint\b', r'\bboolean\b'
-        ]
-        
-        # C++ patterns
-        cpp_patterns = [
-            r'\b#include\b', r'\bstd::', r'\bint\s+main\b', r'\bcout\b',
-            r'\bcin\b', r'\bnamespace\b', r'\busing\s+namespace\b'
-        ]
-        
-        # Count matches for each language
-        scores = {
-            'python': sum(1 for pattern in python_patterns if re.search(pattern, code)),
-            'javascript': sum(1 for pattern in js_patterns if re.search(pattern, code)),
-            'java': sum(1 for pattern in java_patterns if re.search(pattern, code)),
-            'cpp': sum(1 for pattern in cpp_patterns if re.search(pattern, code))
         }
-        
-        # Return language with highest score
-        return max(scores, key=scores.get) if max(scores.values()) > 0 else 'python'
-    
-    def split_code_into_functions(self, code: str) -> List[Tuple[str, str]]:
-        """Split code into minimal logical blocks to reduce API calls"""
-        # For free tier, limit to max 2 blocks to avoid overloading
-        functions = []
-        lines = code.split('\n')
-        
-        # Look for major function/class definitions only
-        major_blocks = []
-        current_block = []
-        
-        for line in lines:
-            stripped = line.strip()
-            
-            # Detect major function/class definitions only
-            if (re.match(r'^\s*def\s+(\w+)', line) or 
-                re.match(r'^\s*class\s+(\w+)', line) or
-                re.match(r'^\s*function\s+(\w+)', line)):
-                
-                # Save previous block if exists and is substantial
-                if current_block and len('\n'.join(current_block).strip()) > 50:
-                    major_blocks.append('\n'.join(current_block))
-                
-                # Start new block
-                current_block = [line]
-            else:
-                current_block.append(line)
-        
-        # Add the last block
-        if current_block:
-            major_blocks.append('\n'.join(current_block))
-        
-        # Limit to maximum 2 blocks for free tier
-        if len(major_blocks) > 2:
-            # Combine smaller blocks
-            first_half = major_blocks[:len(major_blocks)//2]
-            second_half = major_blocks[len(major_blocks)//2:]
-            
-            functions.append(("first_section", '\n'.join(first_half)))
-            functions.append(("second_section", '\n'.join(second_half)))
-        else:
-            for i, block in enumerate(major_blocks):
-                if len(block.strip()) > 10:  # Only include substantial blocks
-                    functions.append((f"section_{i+1}", block))
-        
-        return functions if functions else [("main_code", code)]
-    
-    def explain_code_with_gemini(self, code: str, language: str, is_full_code: bool = True) -> str:
-        """Generate concise explanation using Gemini API"""
-        
-        if is_full_code:
-            # For full code, use comprehensive prompt
-            prompt = f"""Explain this {language} code concisely:
-
-{code}
+        if response_mime_type:
+            # Constrain the model output (e.g. "application/json" for structured replies)
+            payload["generationConfig"]["responseMimeType"] = response_mime_type
 
-Provide: 1) What it does, 2) Key components, 3) How it works. Keep it under 200 words."""
-        else:
-            # For code blocks, use simpler prompt
-            prompt = f"""Briefly explain this {language} code section:
+        # Only waits when the free-tier quota is actually exhausted
+        _BUCKET.acquire()
 
-{code}
+        # Stable URL + key as a query param keeps the connection-pool hit rate high
+        response = self.session.post(
+            self.stream_url,
+            params={"key": self.api_key, "alt": "sse"},
+            json=payload,
+            stream=True,
+            timeout=(3.05, 30)  # separate connect/read timeouts — no 60s hang on dead networks
+        )
 
-What does this part do? Keep it short and clear."""
+        # Raise instead of yielding an error frame — callers translate or fall
+        # back, and the cached layer above must never store a failure
+        response.raise_for_status()
 
-        explanation = self.query_gemini(prompt, max_tokens=800)
-        
-        # If explanation has errors, use fallback
-        if "Error" in explanation or len(explanation) < 20:
-            return self.explain_code_block_simple(code, language)
-        
-        return explanation
-    
-    def explain_code_block_simple(self, code: str, language: str = "python") -> str:
-        """Generate explanation using rule-based approach as fallback"""
-        explanation = f"**{language.title()} Code Analysis:**\n\n"
-        
-        lines = code.split('\n')
-        key_features = []
-        
-        for line in lines:
-            stripped = line.strip()
-            if not stripped or stripped.startswith('#') or stripped.startswith('//'):
+        for line in response.iter_lines(decode_unicode=True):
+            if not line or not line.startswith("data: "):
                 continue
-            
-            # Function definitions
-            if re.match(r'^\s*def\s+(\w+)', line):
-                func_name = re.match(r'^\s*def\s+(\w+)', line).group(1)
-                key_features.append(f"**Function Definition**: Defines `{func_name}()` function")
-            
-            # Class definitions
-            elif re.match(r'^\s*class\s+(\w+)', line):
-                class_name = re.match(r'^\s*class\s+(\w+)', line).group(1)
-                key_features.append(f"**Class Definition**: Defines `{class_name}` class")
-            
-            # Variable assignments
-            elif re.match(r'^\s*(\w+)\s*=', line):
-                var_name = re.match(r'^\s*(\w+)\s*=', line).group(1)
-                key_features.append(f"**Variable Assignment**: Creates/assigns variable `{var_name}`")
-            
-            # Control structures
-            elif re.match(r'^\s*if\s+', line):
-                key_features.append("**Conditional Logic**: Contains if statement for decision making")
-            elif re.match(r'^\s*for\s+', line):
-                key_features.append("**Loop Structure**: Uses for loop for iteration")
-            elif re.match(r'^\s*while\s+', line):
-                key_features.append("**Loop Structure**: Uses while loop for repetition")
-            elif re.match(r'^\s*try\s*:', line):
-                key_features.append("**Error Handling**: Implements try-except for error management")
-            
-            # Return statements
-            elif re.match(r'^\s*return\s+', line):
-                key_features.append("**Return Statement**: Returns value from function")
-            
-            # Import statements
-            elif re.match(r'^\s*import\s+', line):
-                key_features.append("**Module Import**: Imports external libraries/modules")
-            
-            # Print/output statements
-            elif re.match(r'^\s*print\s*\(', line):
-                key_features.append("**Output**: Displays information to console")
-        
-        # Format the features
-        if key_features:
-            explanation += "\n".join(f"• {feature}" for feature in key_features)
-        else:
-            explanation += "• Contains basic programming logic and statements"
-        
-        return explanation
+            try:
+                chunk = _json_loads(line[6:])
+                yield chunk['candidates'][0]['content']['parts'][0]['text']
+            except (ValueError, KeyError, IndexError):
+                # Skip keep-alive / malformed frames
+                continue
+
+    @st.cache_data(ttl=3600, max_entries=256, show_spinner=False)
+    def _query_gemini_cached(_self, prompt: str, max_tokens: int = 1000, response_mime_type: str = None) -> str:
+        """Single Gemini round trip, cached by prompt.
+
+        Raises on transport failures and empty replies — st.cache_data doesn't
+        cache exceptions, so an outage can't pin an error under this prompt's
+        key for the whole TTL.
+        """
+        text = "".join(_self.query_gemini_stream(prompt, max_tokens, response_mime_type)).strip()
+        if not text:
+            raise ValueError("No response generated")
+        return text
+
+    def query_gemini(self, prompt: str, max_tokens: int = 1000, response_mime_type: str = None) -> str:
+        """Query Gemini API; failures become the legacy sentinel string, uncached"""
+        try:
+            return self._query_gemini_cached(prompt, max_tokens, response_mime_type)
+        except Exception as e:
+            return f"Error querying Gemini: {str(e)}"
+
+    def explain_and_detect_language(self, code: str):
+        """Get the language and overall explanation in a single Gemini round trip.
+
+        Returns (language, explanation) or None when the structured reply can't
+        be parsed, in which case callers fall back to the two-call path.
+        """
+        prompt = f"""Analyze this code and return ONLY a JSON object with two keys:
+"language" (one lowercase token, e.g. "python") and "explanation" (markdown, under 200 words,
+covering: 1) What it does, 2) Key components, 3) How it works).
+
+Code:
+{code}"""
+
+        response = self.query_gemini(prompt, max_tokens=1000, response_mime_type="application/json")
+        try:
+            data = _json_loads(response)
+            language = str(data["language"]).lower().strip()
+            explanation = data["explanation"]
+        except (ValueError, KeyError, TypeError):
+            return None
+        if language and explanation:
+            return language, explanation
+        return None
     
-    def generate_inline_comments(self, code: str, language: str) -> str:
-        """Generate inline comments using simple prompt"""
-        
-        prompt = f"""Add brief comments to this {language} code:
+    def explain_and_comment(self, code: str, language: str):
+        """Get the overall explanation and commented code in one round trip.
 
-{code}
+        Returns (explanation, commented_code) or None when the structured
+        reply can't be parsed, in which case callers fall back to the
+        two-call path.
+        """
+        prompt = f"""Analyze this {language} code and return ONLY a JSON object with two keys:
+"explanation" (markdown, under 200 words, covering: 1) What it does, 2) Key components,
+3) How it works) and "commented_code" (the code verbatim with brief inline comments
+added to important lines, using the correct comment syntax for {language}).
 
-Add # comments for important lines only. Keep comments short."""
+Code:
+{code}"""
 
-        commented_code = self.query_gemini(prompt, max_tokens=1000)
-        
-        # If Gemini fails, use rule-based approach
-        if "Error" in commented_code or len(commented_code) < len(code):
-            return self._generate_comments_rule_based(code, language)
-        
-        return commented_code
+        response = self.query_gemini(prompt, max_tokens=2000, response_mime_type="application/json")
+        try:
+            data = _json_loads(response)
+            explanation = data["explanation"]
+            commented_code = data["commented_code"]
+        except (ValueError, KeyError, TypeError):
+            return None
+        if explanation and commented_code:
+            return explanation, commented_code
+        return None
     
-    def detect_language_with_gemini(self, code: str) -> str:
-        """Use Gemini API for accurate language detection"""
+    @st.cache_data(max_entries=64, show_spinner=False)
+    def _detect_language_with_gemini_cached(_self, code: str) -> str:
+        """Use Gemini API for accurate language detection (cached per code input).
+
+        Raises when Gemini is unreachable or names no known language, so a
+        transient failure never pins the regex fallback's guess in this cache.
+        """
         prompt = f"""Identify the programming language of this code. Respond with ONLY the language name (e.g., "python", "javascript", "java", "csharp", "cpp", "typescript", "go", "rust", "kotlin", "swift", "php", "ruby", "scala", "dart", "r", "matlab", "sql", "html", "css", "bash", "powershell", "yaml", "json", "xml").
 
 Code:
@@ -274,224 +473,106 @@ Code:
 
 Language:"""
         
+        response = _self._query_gemini_cached(prompt, max_tokens=50)
+        
+        # Clean up the response
+        language = response.lower().strip()
+        
+        # Handle common variations
+        language_mapping = {
+            "c#": "csharp",
+            "c sharp": "csharp",
+            "c++": "cpp",
+            "c plus plus": "cpp",
+            "js": "javascript",
+            "ts": "typescript",
+            "py": "python",
+            "rb": "ruby",
+            "sh": "bash",
+            "shell": "bash",
+            "powershell": "powershell",
+            "ps1": "powershell",
+            "yml": "yaml",
+            "objective-c": "objectivec",
+            "objc": "objectivec"
+        }
+        
+        # Check for exact matches first
+        if language in language_mapping:
+            return language_mapping[language]
+        
+        # Check if response contains a valid language
+        valid_languages = [
+            "python", "javascript", "java", "csharp", "cpp", "typescript", 
+            "go", "rust", "kotlin", "swift", "php", "ruby", "scala", "dart",
+            "r", "matlab", "sql", "html", "css", "bash", "powershell", 
+            "yaml", "json", "xml", "objectivec", "perl", "lua", "haskell",
+            "clojure", "erlang", "elixir", "f#", "fsharp", "vb", "vbnet",
+            "cobol", "fortran", "assembly", "asm"
+        ]
+        
+        for lang in valid_languages:
+            if lang in language:
+                return lang
+        
+        # Nothing recognizable in the reply — treat as a failed detection
+        raise ValueError(f"unrecognized language reply: {language[:40]!r}")
+    
+    def detect_language_with_gemini(self, code: str) -> str:
+        """Detect the language via Gemini, falling back to the regex scorer.
+
+        The fallback runs outside the cached layer so Gemini is consulted
+        again on the next call once it's healthy.
+        """
         try:
-            response = self.query_gemini(prompt, max_tokens=50)
-            
-            # Clean up the response
-            language = response.lower().strip()
-            
-            # Handle common variations
-            language_mapping = {
-                "c#": "csharp",
-                "c sharp": "csharp",
-                "c++": "cpp",
-                "c plus plus": "cpp",
-                "js": "javascript",
-                "ts": "typescript",
-                "py": "python",
-                "rb": "ruby",
-                "sh": "bash",
-                "shell": "bash",
-                "powershell": "powershell",
-                "ps1": "powershell",
-                "yml": "yaml",
-                "objective-c": "objectivec",
-                "objc": "objectivec"
-            }
-            
-            # Check for exact matches first
-            if language in language_mapping:
-                return language_mapping[language]
-            
-            # Check if response contains a valid language
-            valid_languages = [
-                "python", "javascript", "java", "csharp", "cpp", "typescript", 
-                "go", "rust", "kotlin", "swift", "php", "ruby", "scala", "dart",
-                "r", "matlab", "sql", "html", "css", "bash", "powershell", 
-                "yaml", "json", "xml", "objectivec", "perl", "lua", "haskell",
-                "clojure", "erlang", "elixir", "f#", "fsharp", "vb", "vbnet",
-                "cobol", "fortran", "assembly", "asm"
-            ]
-            
-            for lang in valid_languages:
-                if lang in language:
-                    return lang
-            
-            # If Gemini detection fails, fall back to rule-based
-            return self.detect_language_fallback(code)
-            
+            return self._detect_language_with_gemini_cached(code)
         except Exception as e:
             st.warning(f"Gemini language detection failed: {str(e)}. Using fallback method.")
             return self.detect_language_fallback(code)
     
-    def detect_language_fallback(self, code: str) -> str:
-        """Enhanced fallback language detection with more languages"""
-        # Expanded patterns for better detection
-        language_patterns = {
-            'python': [
-                r'\bdef\s+\w+\s*\(', r'\bimport\s+\w+', r'\bfrom\s+\w+\s+import\b',
-                r'\bprint\s*\(', r'\bif\s+.*:', r'\bfor\s+.*:', r'\bwhile\s+.*:',
-                r'\btry\s*:', r'\bclass\s+\w+.*:', r'\bwith\s+.*:', r'\bexcept\s*.*:',
-                r'\belif\s+.*:', r'\bpass\b', r'\bNone\b', r'\bTrue\b', r'\bFalse\b'
-            ],
-            'javascript': [
-                r'\bfunction\s+\w+\s*\(', r'\bconst\s+\w+', r'\blet\s+\w+', r'\bvar\s+\w+',
-                r'=>', r'\bconsole\.log\b', r'\bdocument\b', r'\bwindow\b',
-                r'\breturn\b', r'{\s*$', r'}\s*$', r'\bnew\s+\w+', r'\bthis\.',
-                r'\bfunction\s*\(', r'\b(null|undefined)\b'
-            ],
-            'typescript': [
-                r'\binterface\s+\w+', r'\btype\s+\w+\s*=', r':\s*(string|number|boolean)',
-                r'\bexport\s+interface', r'\bimport\s+.*\bfrom\b', r'<.*>',
-                r'\bgeneric\b', r'\bnamespace\s+\w+'
-            ],
-            'java': [
-                r'\bpublic\s+class\s+\w+', r'\bpublic\s+static\s+void\s+main',
-                r'\bprivate\s+\w+', r'\bprotected\s+\w+', r'\bSystem\.out\.println',
-                r'\bvoid\s+\w+\s*\(', r'\bString\s+\w+', r'\bint\s+\w+', r'\bboolean\s+\w+',
-                r'\bpublic\s+\w+\s+\w+\s*\(', r'\bthrows\s+\w+', r'\bextends\s+\w+',
-                r'\bimplements\s+\w+', r'\bpackage\s+[\w.]+;'
-            ],
-            'csharp': [
-                r'\busing\s+System', r'\bnamespace\s+\w+', r'\bpublic\s+class\s+\w+',
-                r'\bpublic\s+static\s+void\s+Main', r'\bConsole\.WriteLine',
-                r'\bprivate\s+\w+', r'\bpublic\s+\w+', r'\bprotected\s+\w+',
-                r'\bstring\s+\w+', r'\bint\s+\w+', r'\bbool\s+\w+', r'\bvar\s+\w+\s*=',
-                r'\bnew\s+\w+\s*\(', r'\bget\s*;', r'\bset\s*;', r'\bthis\.',
-                r'\boverride\s+\w+', r'\bvirtual\s+\w+', r'\babstract\s+\w+'
-            ],
-            'cpp': [
-                r'\b#include\s*<.*>', r'\bstd::', r'\bint\s+main\s*\(',
-                r'\bcout\s*<<', r'\bcin\s*>>', r'\bnamespace\s+\w+',
-                r'\busing\s+namespace\s+std', r'\bclass\s+\w+', r'\bpublic\s*:',
-                r'\bprivate\s*:', r'\bprotected\s*:', r'\bvirtual\s+\w+',
-                r'\btemplate\s*<.*>', r'\btypedef\s+\w+'
-            ],
-            'go': [
-                r'\bpackage\s+main', r'\bfunc\s+main\s*\(\)', r'\bfunc\s+\w+\s*\(',
-                r'\bimport\s+\(', r'\bfmt\.Print', r'\bvar\s+\w+\s+\w+',
-                r'\btype\s+\w+\s+struct', r'\bgo\s+\w+\s*\(', r'\bchan\s+\w+',
-                r'\brange\s+\w+', r'\bdefer\s+\w+', r'\binterface\s*{'
-            ],
-            'rust': [
-                r'\bfn\s+main\s*\(\)', r'\bfn\s+\w+\s*\(', r'\blet\s+\w+',
-                r'\blet\s+mut\s+\w+', r'\bprintln!\s*\(', r'\buse\s+\w+',
-                r'\bstruct\s+\w+', r'\bimpl\s+\w+', r'\btrait\s+\w+',
-                r'\bmatch\s+\w+', r'\bSome\s*\(', r'\bNone\b', r'\bResult\s*<'
-            ],
-            'php': [
-                r'<\?php', r'\$\w+', r'\becho\s+', r'\bprint\s+',
-                r'\bfunction\s+\w+\s*\(', r'\bclass\s+\w+', r'\bpublic\s+function',
-                r'\bprivate\s+function', r'\bprotected\s+function', r'\bextends\s+\w+',
-                r'\bimplements\s+\w+', r'\bnew\s+\w+\s*\('
-            ],
-            'ruby': [
-                r'\bdef\s+\w+', r'\bclass\s+\w+', r'\bmodule\s+\w+',
-                r'\bputs\s+', r'\bprint\s+', r'\bbegin\b', r'\brescue\b',
-                r'\bensure\b', r'\bend\b', r'\bif\s+.*\bthen\b', r'\bunless\s+',
-                r'\bcase\s+', r'\bwhen\s+', r'@\w+', r'@@\w+'
-            ],
-            'kotlin': [
-                r'\bfun\s+main\s*\(', r'\bfun\s+\w+\s*\(', r'\bval\s+\w+',
-                r'\bvar\s+\w+', r'\bclass\s+\w+', r'\bobject\s+\w+',
-                r'\bdata\s+class', r'\bsealed\s+class', r'\bwhen\s*\(',
-                r'\bprintln\s*\(', r'\bcompanion\s+object'
-            ],
-            'swift': [
-                r'\bfunc\s+\w+\s*\(', r'\bvar\s+\w+\s*:', r'\blet\s+\w+\s*:',
-                r'\bclass\s+\w+', r'\bstruct\s+\w+', r'\benum\s+\w+',
-                r'\bprotocol\s+\w+', r'\bextension\s+\w+', r'\bprint\s*\(',
-                r'\bif\s+let\s+', r'\bguard\s+let', r'\bswitch\s+\w+'
-            ],
-            'scala': [
-                r'\bobject\s+\w+', r'\bdef\s+main\s*\(', r'\bdef\s+\w+\s*\(',
-                r'\bval\s+\w+', r'\bvar\s+\w+', r'\bclass\s+\w+', r'\btrait\s+\w+',
-                r'\bcase\s+class', r'\bcase\s+object', r'\bmatch\s*\{',
-                r'\bprintln\s*\(', r'\bimport\s+scala'
-            ],
-            'dart': [
-                r'\bvoid\s+main\s*\(', r'\bclass\s+\w+', r'\bString\s+\w+',
-                r'\bint\s+\w+', r'\bdouble\s+\w+', r'\bbool\s+\w+',
-                r'\bprint\s*\(', r'\bfinal\s+\w+', r'\bconst\s+\w+',
-                r'\bextends\s+\w+', r'\bimplements\s+\w+', r'\basync\s+\w+'
-            ],
-            'r': [
-                r'\blibrary\s*\(', r'\brequire\s*\(', r'\bfunction\s*\(',
-                r'\bdata\.frame\s*\(', r'\bc\s*\(', r'\blist\s*\(',
-                r'\bggplot\s*\(', r'\baes\s*\(', r'\bsummary\s*\(',
-                r'<-', r'\bprint\s*\(', r'\bcat\s*\('
-            ],
-            'matlab': [
-                r'\bfunction\s+.*=\s*\w+\s*\(', r'\bend\s*$', r'\bdisp\s*\(',
-                r'\bfprintf\s*\(', r'\bplot\s*\(', r'\bfigure\s*\(',
-                r'\bhold\s+on', r'\bhold\s+off', r'%.*$', r'\bclc\b', r'\bclear\b'
-            ],
-            'sql': [
-                r'\bSELECT\s+.*\bFROM\b', r'\bINSERT\s+INTO\b', r'\bUPDATE\s+.*\bSET\b',
-                r'\bDELETE\s+FROM\b', r'\bCREATE\s+TABLE\b', r'\bDROP\s+TABLE\b',
-                r'\bALTER\s+TABLE\b', r'\bWHERE\s+', r'\bORDER\s+BY\b',
-                r'\bGROUP\s+BY\b', r'\bHAVING\s+', r'\bJOIN\s+.*\bON\b'
-            ],
-            'html': [
-                r'<!DOCTYPE\s+html>', r'<html.*>', r'<head.*>', r'<body.*>',
-                r'<div.*>', r'<span.*>', r'<p.*>', r'<a\s+href=',
-                r'<img\s+src=', r'<script.*>', r'<style.*>', r'<link.*>'
-            ],
-            'css': [
-                r'[\w-]+\s*\{', r'[\w-]+\s*:\s*[^;]+;', r'@import\s+',
-                r'@media\s+', r'@keyframes\s+', r'#[\w-]+\s*\{',
-                r'\.[\w-]+\s*\{', r'color\s*:', r'background\s*:',
-                r'margin\s*:', r'padding\s*:', r'font-size\s*:'
-            ],
-            'bash': [
-                r'#!/bin/bash', r'#!/bin/sh', r'\becho\s+', r'\bif\s+\[',
-                r'\bfi\b', r'\bfor\s+\w+\s+in\b', r'\bdone\b', r'\bwhile\s+\[',
-                r'\bfunction\s+\w+\s*\(', r'\$\w+', r'\$\{.*\}', r'\bexport\s+'
-            ],
-            'powershell': [
-                r'\$\w+', r'\bWrite-Host\b', r'\bGet-\w+', r'\bSet-\w+',
-                r'\bNew-\w+', r'\bRemove-\w+', r'\bInvoke-\w+', r'\bTest-\w+',
-                r'\bif\s*\(.*\)\s*\{', r'\bforeach\s*\(', r'\bparam\s*\(',
-                r'\bfunction\s+\w+\s*\{', r'\[string\]', r'\[int\]'
-            ],
-            'yaml': [
-                r'^\s*\w+\s*:', r'^\s*-\s+\w+', r'---\s*$', r'^\s*#.*',
-                r'^\s*\w+\s*:\s*\|', r'^\s*\w+\s*:\s*>', r'^\s*\w+\s*:\s*\[',
-                r'version\s*:', r'apiVersion\s*:', r'kind\s*:'
-            ],
-            'json': [
-                r'^\s*\{', r'^\s*\[', r'"\w+"\s*:\s*', r'"\w+"\s*:\s*"',
-                r'"\w+"\s*:\s*\d+', r'"\w+"\s*:\s*true', r'"\w+"\s*:\s*false',
-                r'"\w+"\s*:\s*null', r'^\s*\}', r'^\s*\]'
-            ],
-            'xml': [
-                r'<\?xml\s+version=', r'<\w+.*?>', r'</\w+>', r'<\w+\s+.*?/>',
-                r'<!\[CDATA\[', r'<!--.*?-->', r'<!\s*DOCTYPE\s+',
-                r'xmlns\s*=', r'<\w+:\w+.*?>'
-            ]
+    @st.cache_data(max_entries=64, show_spinner=False)
+    def detect_language_fallback(_self, code: str) -> str:
+        """Enhanced fallback language detection with more languages.
+
+        Pure function of the input — cached so sidebar toggles don't rescan
+        the code with every language pattern on each rerun.
+        """
+        # Fast path: a decisive signature near the top of the file settles it
+        # without scoring every language
+        for pattern, lang in _SIGNATURES:
+            if pattern.search(code[:256]):
+                return lang
+
+        # Language is unambiguous from a small sample; scanning a 100 KB paste
+        # with every pattern buys nothing, so cap at the first and last 2 KB
+        sample = code[:2048] + "\n" + code[-2048:] if len(code) > 4096 else code
+
+        # Sum matches per pattern — the lists deliberately overlap (e.g. rust
+        # shares fn/let/println! shapes with several languages) and a fused
+        # alternation would count each span only once, deflating those scores
+        scores = {
+            lang: sum(len(pattern.findall(sample)) for pattern in patterns)
+            for lang, patterns in _LANGUAGE_PATTERNS.items()
         }
         
-        # Count matches for each language
-        scores = {}
-        for lang, patterns in language_patterns.items():
-            score = 0
-            for pattern in patterns:
-                matches = re.findall(pattern, code, re.MULTILINE | re.IGNORECASE)
-                score += len(matches)
-            scores[lang] = score
-        
         # Return language with highest score, default to python if no matches
-        if max(scores.values()) > 0:
-            return max(scores, key=scores.get)
-        else:
-            return 'python'  # Default fallback
+        best_lang, best_score = 'python', 0
+        for lang, score in scores.items():
+            if score > best_score:
+                best_lang, best_score = lang, score
+        return best_lang
     
     def detect_language(self, code: str) -> str:
         """Main language detection method - uses Gemini first, then fallback"""
         return self.detect_language_with_gemini(code)
     
-    def split_code_into_functions(self, code: str) -> List[Tuple[str, str]]:
-        """Split code into minimal logical blocks to reduce API calls"""
+    @st.cache_data(max_entries=64, show_spinner=False)
+    def split_code_into_functions(_self, code: str) -> List[Tuple[str, str]]:
+        """Split code into minimal logical blocks to reduce API calls.
+
+        Cached per input — the line-by-line boundary scan is pure CPU work
+        that Streamlit would otherwise repeat on every rerun.
+        """
         # For free tier, limit to max 2 blocks to avoid overloading
         functions = []
         lines = code.split('\n')
@@ -501,23 +582,16 @@ Language:"""
         current_block = []
         
         for line in lines:
-            stripped = line.strip()
-            
             # Detect major function/class definitions for multiple languages
-            if (re.match(r'^\s*def\s+(\w+)', line) or  # Python
-                re.match(r'^\s*class\s+(\w+)', line) or  # Python, Java, C#
-                re.match(r'^\s*function\s+(\w+)', line) or  # JavaScript
-                re.match(r'^\s*public\s+class\s+(\w+)', line) or  # Java, C#
-                re.match(r'^\s*public\s+static\s+\w+\s+(\w+)', line) or  # Java, C#
-                re.match(r'^\s*namespace\s+(\w+)', line) or  # C#
-                re.match(r'^\s*using\s+System', line) or  # C#
-                re.match(r'^\s*package\s+[\w.]+', line) or  # Java
-                re.match(r'^\s*func\s+(\w+)', line) or  # Go, Swift
-                re.match(r'^\s*fn\s+(\w+)', line)):  # Rust
+            if any(pattern.match(line) for pattern in _BLOCK_BOUNDARY_RES):
                 
-                # Save previous block if exists and is substantial
-                if current_block and len('\n'.join(current_block).strip()) > 50:
-                    major_blocks.append('\n'.join(current_block))
+                # Save previous block if exists and is substantial — joining
+                # once per block (not per line) keeps the scan linear while
+                # preserving the original indentation-inclusive length measure
+                if current_block:
+                    block_text = '\n'.join(current_block)
+                    if len(block_text.strip()) > 50:
+                        major_blocks.append(block_text)
                 
                 # Start new block
                 current_block = [line]
@@ -543,8 +617,14 @@ Language:"""
         
         return functions if functions else [("main_code", code)]
     
-    def explain_code_with_gemini(self, code: str, language: str, is_full_code: bool = True) -> str:
-        """Generate concise explanation using Gemini API"""
+    @st.cache_data(ttl=3600, max_entries=256, show_spinner=False)
+    def _explain_code_with_gemini_cached(_self, code: str, language: str, is_full_code: bool = True) -> str:
+        """Generate concise explanation using Gemini API.
+
+        Cached on (code, language, is_full_code) so example reruns are served
+        locally instead of re-hitting the rate-limited API. Raises on failure
+        so fallback text never lands in this cache under the Gemini key.
+        """
         
         if is_full_code:
             # For full code, use comprehensive prompt
@@ -561,16 +641,76 @@ Provide: 1) What it does, 2) Key components, 3) How it works. Keep it under 200
 
 What does this part do? Keep it short and clear."""
 
-        explanation = self.query_gemini(prompt, max_tokens=800)
-        
-        # If explanation has errors, use fallback
-        if "Error" in explanation or len(explanation) < 20:
-            return self.explain_code_block_simple(code, language)
+        # _query_gemini_cached raises on failure, so only an implausibly
+        # short reply needs rejecting here
+        explanation = _self._query_gemini_cached(prompt, max_tokens=800)
+        if len(explanation) < 20:
+            raise ValueError("implausibly short explanation reply")
         
         return explanation
     
-    def explain_code_block_simple(self, code: str, language: str = "python") -> str:
-        """Generate explanation using rule-based approach as fallback"""
+    def explain_code_with_gemini(self, code: str, language: str, is_full_code: bool = True) -> str:
+        """Explain code via Gemini, falling back to the rule-based explainer.
+
+        The fallback happens outside the cached layer so a transient failure
+        is retried on the next call instead of being memoized for an hour.
+        """
+        try:
+            return self._explain_code_with_gemini_cached(code, language, is_full_code)
+        except Exception:
+            return self.explain_code_block_simple(code, language)
+    
+    def explain_blocks_batched(self, blocks, language: str) -> Tuple[Dict[str, str], bool]:
+        """Explain several code sections with a single Gemini call.
+
+        Each block used to cost its own round trip; concatenating them into one
+        prompt and asking for a JSON array of explanations pays the request and
+        prompt-boilerplate overhead once instead of per block. Returns the
+        explanations plus a flag saying whether any section fell back to the
+        rule-based path, so callers can mark the result as degraded.
+        """
+        sections = "\n".join(
+            f"### SECTION {i} ###\n{block_code}"
+            for i, (_, block_code) in enumerate(blocks)
+        )
+        prompt = f"""Briefly explain each {language} code section below.
+
+{sections}
+
+Return a JSON array of strings, one short explanation per section, in order."""
+
+        response = self.query_gemini(
+            prompt,
+            max_tokens=800,
+            response_mime_type="application/json",
+        )
+
+        explanations = {}
+        try:
+            parsed = _json_loads(response)
+            if not isinstance(parsed, list):
+                raise ValueError("expected a JSON array")
+            for (block_name, block_code), text in zip(blocks, parsed):
+                explanations[block_name] = str(text)
+        except (ValueError, TypeError):
+            parsed = []
+
+        # Any section the reply didn't cover falls back to the rule-based path
+        used_fallback = False
+        for block_name, block_code in blocks:
+            if not explanations.get(block_name):
+                explanations[block_name] = self.explain_code_block_simple(block_code, language)
+                used_fallback = True
+
+        return explanations, used_fallback
+    
+    @st.cache_data(max_entries=128, show_spinner=False)
+    def explain_code_block_simple(_self, code: str, language: str = "python") -> str:
+        """Generate explanation using rule-based approach as fallback.
+
+        Pure function of (code, language) — cached so error-retry reruns
+        don't redo the line scan.
+        """
         explanation = f"**{language.title()} Code Analysis:**\n\n"
         
         lines = code.split('\n')
@@ -578,67 +718,49 @@ What does this part do? Keep it short and clear."""
         
         for line in lines:
             stripped = line.strip()
-            if not stripped or stripped.startswith('#') or stripped.startswith('//'):
+            if not stripped or stripped.startswith(('#', '//')):
                 continue
             
-            # Enhanced pattern matching for multiple languages
-            patterns = {
-                'function': [r'^\s*def\s+(\w+)', r'^\s*function\s+(\w+)', r'^\s*func\s+(\w+)', r'^\s*fn\s+(\w+)'],
-                'class': [r'^\s*class\s+(\w+)', r'^\s*public\s+class\s+(\w+)'],
-                'variable': [r'^\s*(\w+)\s*=', r'^\s*let\s+(\w+)', r'^\s*var\s+(\w+)', r'^\s*const\s+(\w+)'],
-                'conditional': [r'^\s*if\s+', r'^\s*elif\s+', r'^\s*else\s*:', r'^\s*switch\s+'],
-                'loop': [r'^\s*for\s+', r'^\s*while\s+', r'^\s*foreach\s+'],
-                'error_handling': [r'^\s*try\s*:', r'^\s*catch\s*', r'^\s*except\s*', r'^\s*finally\s*'],
-                'return': [r'^\s*return\s+'],
-                'import': [r'^\s*import\s+', r'^\s*from\s+.*import', r'^\s*using\s+', r'^\s*#include'],
-                'output': [r'^\s*print\s*\(', r'^\s*console\.log', r'^\s*Console\.WriteLine', r'^\s*println!']
-            }
-            
-            # Check patterns
-            for feature_type, pattern_list in patterns.items():
-                for pattern in pattern_list:
-                    if re.search(pattern, line):
-                        if feature_type == 'function':
-                            match = re.search(pattern, line)
-                            if match:
-                                key_features.append(f"**Function Definition**: Defines `{match.group(1)}()` function")
-                        elif feature_type == 'class':
-                            match = re.search(pattern, line)
-                            if match:
-                                key_features.append(f"**Class Definition**: Defines `{match.group(1)}` class")
-                        elif feature_type == 'variable':
-                            match = re.search(pattern, line)
-                            if match:
-                                key_features.append(f"**Variable Assignment**: Creates/assigns variable `{match.group(1)}`")
-                        elif feature_type == 'conditional':
-                            key_features.append("**Conditional Logic**: Contains conditional statement for decision making")
-                        elif feature_type == 'loop':
-                            key_features.append("**Loop Structure**: Uses loop for iteration")
-                        elif feature_type == 'error_handling':
-                            key_features.append("**Error Handling**: Implements error handling mechanism")
-                        elif feature_type == 'return':
-                            key_features.append("**Return Statement**: Returns value from function")
-                        elif feature_type == 'import':
-                            key_features.append("**Module Import**: Imports external libraries/modules")
-                        elif feature_type == 'output':
-                            key_features.append("**Output**: Displays information to console")
-                        break
+            # Fixed-prefix features are resolved with startswith alone; only
+            # lines that may carry an identifier fall through to the regex
+            for prefixes, feature_type in _FEATURE_PREFIXES:
+                if stripped.startswith(prefixes):
+                    key_features.append(_FEATURE_MESSAGES[feature_type])
+                    break
+            else:
+                match = _FEATURE_DISPATCH_RE.match(stripped)
+                if not match:
+                    continue
+
+                # Groups 2/4/6 are the identifier captures nested in the
+                # function/class/variable alternatives
+                feature_type = match.lastgroup
+                if feature_type == 'function':
+                    key_features.append(f"**Function Definition**: Defines `{match.group(2)}()` function")
+                elif feature_type == 'class':
+                    key_features.append(f"**Class Definition**: Defines `{match.group(4)}` class")
+                elif feature_type == 'variable':
+                    key_features.append(f"**Variable Assignment**: Creates/assigns variable `{match.group(6)}`")
+                else:
+                    key_features.append(_FEATURE_MESSAGES[feature_type])
         
         # Format the features
         if key_features:
-            # Remove duplicates while preserving order
-            unique_features = []
-            for feature in key_features:
-                if feature not in unique_features:
-                    unique_features.append(feature)
+            # Remove duplicates while preserving order — dict.fromkeys is O(n)
+            unique_features = list(dict.fromkeys(key_features))
             explanation += "\n".join(f"• {feature}" for feature in unique_features)
         else:
             explanation += "• Contains basic programming logic and statements"
         
         return explanation
     
-    def generate_inline_comments(self, code: str, language: str) -> str:
-        """Generate inline comments using simple prompt"""
+    @st.cache_data(ttl=3600, max_entries=256, show_spinner=False)
+    def _generate_inline_comments_cached(_self, code: str, language: str) -> str:
+        """Generate inline comments using simple prompt (cached per input).
+
+        Raises on failure or a truncated reply so degraded output is never
+        cached under the Gemini key.
+        """
         
         prompt = f"""Add brief comments to this {language} code:
 
@@ -646,89 +768,171 @@ What does this part do? Keep it short and clear."""
 
 Add appropriate comments for important lines only. Keep comments short and use the correct comment syntax for {language}."""
 
-        commented_code = self.query_gemini(prompt, max_tokens=1000)
-        
-        # If Gemini fails, use rule-based approach
-        if "Error" in commented_code or len(commented_code) < len(code):
-            return self._generate_comments_rule_based(code, language)
+        commented_code = _self._query_gemini_cached(prompt, max_tokens=1000)
+        if len(commented_code) < len(code):
+            raise ValueError("commented reply shorter than the input")
         
         return commented_code
     
+    def generate_inline_comments(self, code: str, language: str) -> str:
+        """Comment code via Gemini, falling back to the rule-based pass.
+
+        As with explanations, the fallback stays outside the cached layer so
+        failures are retried rather than memoized.
+        """
+        try:
+            return self._generate_inline_comments_cached(code, language)
+        except Exception:
+            return self._generate_comments_rule_based(code, language)
     
-    def _generate_comments_rule_based(self, code: str, language: str) -> str:
-        """Generate comments using rule-based approach"""
-        lines = code.split('\n')
-        commented_lines = []
+    
+    @st.cache_data(max_entries=128, show_spinner=False)
+    def _generate_comments_rule_based(_self, code: str, language: str) -> str:
+        """Generate comments using rule-based approach (cached per input)"""
+        # For Python, one C-level ast.parse replaces all per-line regex work;
+        # other languages (and unparseable Python) keep the keyword dispatch
+        line_comments = _self._ast_line_comments(code) if language == "python" else None
+
+        # Write annotated lines straight into one growing buffer — the list +
+        # join pattern would hold every line plus the final string at peak
+        buf = io.StringIO()
+        comment_prefix = "  # " if language == "python" else "  // "
         
-        for line in lines:
+        for lineno, line in enumerate(code.split('\n'), start=1):
             stripped = line.strip()
+            buf.write(line)
             
-            # Skip empty lines and existing comments
-            if not stripped or stripped.startswith('#') or stripped.startswith('//'):
-                commented_lines.append(line)
-                continue
-            
-            comment = self._generate_line_comment(stripped, language)
-            if comment:
-                comment_prefix = "  #" if language == "python" else "  //"
-                commented_lines.append(f"{line}{comment_prefix} {comment}")
-            else:
-                commented_lines.append(line)
+            if line_comments is not None:
+                comment = line_comments.get(lineno, "")
+                if comment:
+                    buf.write(comment_prefix)
+                    buf.write(comment)
+            # Lines too short for any keyword, blanks and existing comments
+            # need no dispatch work
+            elif len(stripped) >= 4 and not stripped.startswith(('#', '//')):
+                comment = _self._generate_line_comment(stripped, language)
+                if comment:
+                    buf.write(comment_prefix)
+                    buf.write(comment)
+            buf.write('\n')
         
-        return '\n'.join(commented_lines)
+        # Drop the trailing newline the loop adds after the last line
+        return buf.getvalue()[:-1]
+
+    def _ast_line_comments(self, code: str) -> Optional[Dict[int, str]]:
+        """Map line numbers to comments from one ast.parse of the code.
+
+        Returns None when the code doesn't parse, so the caller falls back to
+        the per-line keyword dispatch.
+        """
+        try:
+            tree = ast.parse(code)
+        except (SyntaxError, ValueError):
+            return None
+
+        line_comments = {}
+        for node in ast.walk(tree):
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                comment = f"Define function {node.name}"
+            elif isinstance(node, ast.ClassDef):
+                comment = f"Define class {node.name}"
+            elif isinstance(node, ast.Assign):
+                target = node.targets[0]
+                if not isinstance(target, ast.Name):
+                    continue
+                comment = f"Set {target.id} variable"
+            elif isinstance(node, ast.If):
+                comment = "Check condition"
+            elif isinstance(node, (ast.For, ast.AsyncFor)):
+                comment = "Start loop iteration"
+            elif isinstance(node, ast.While):
+                comment = "Start conditional loop"
+            elif isinstance(node, ast.Try):
+                comment = "Begin error handling"
+            elif isinstance(node, ast.ExceptHandler):
+                comment = "Handle errors"
+            elif isinstance(node, ast.Return):
+                comment = "Return result"
+            elif isinstance(node, ast.Import):
+                comment = "Import module"
+            elif isinstance(node, ast.ImportFrom):
+                comment = "Import specific items"
+            elif (isinstance(node, ast.Expr) and isinstance(node.value, ast.Call)
+                    and isinstance(node.value.func, ast.Name) and node.value.func.id == "print"):
+                comment = "Display output"
+            else:
+                continue
+            # First writer wins so a statement's own comment isn't clobbered
+            # by nested nodes that start on the same line
+            line_comments.setdefault(node.lineno, comment)
+
+        return line_comments
     
     def _generate_line_comment(self, line: str, language: str) -> str:
-        """Generate a comment for a specific line"""
-        # Function definitions
-        if re.match(r'^\s*def\s+(\w+)', line):
-            func_name = re.match(r'^\s*def\s+(\w+)', line).group(1)
-            return f"Define function {func_name}"
-        
-        # Class definitions
-        if re.match(r'^\s*class\s+(\w+)', line):
-            class_name = re.match(r'^\s*class\s+(\w+)', line).group(1)
-            return f"Define class {class_name}"
-        
-        # Variable assignments
-        if re.match(r'^\s*(\w+)\s*=', line):
-            var_name = re.match(r'^\s*(\w+)\s*=', line).group(1)
-            return f"Set {var_name} variable"
-        
-        # Control structures
-        if re.match(r'^\s*if\s+', line):
-            return "Check condition"
-        if re.match(r'^\s*elif\s+', line):
-            return "Check alternative condition"
-        if re.match(r'^\s*else\s*:', line):
-            return "Handle remaining cases"
-        if re.match(r'^\s*for\s+', line):
-            return "Start loop iteration"
-        if re.match(r'^\s*while\s+', line):
-            return "Start conditional loop"
-        if re.match(r'^\s*try\s*:', line):
-            return "Begin error handling"
-        if re.match(r'^\s*except\s*.*:', line):
-            return "Handle errors"
-        if re.match(r'^\s*finally\s*:', line):
-            return "Cleanup operations"
-        
-        # Return and output
-        if re.match(r'^\s*return\s+', line):
-            return "Return result"
-        if re.match(r'^\s*print\s*\(', line):
+        """Generate a comment for a specific (stripped) line"""
+        head = line.split(None, 1)[0] if line else ''
+
+        # Lines carrying an identifier are the only ones that need a regex
+        if head == 'def':
+            match = _DEF_NAME_RE.match(line)
+            if match:
+                return f"Define function {match.group(1)}"
+        elif head == 'class':
+            match = _CLASS_NAME_RE.match(line)
+            if match:
+                return f"Define class {match.group(1)}"
+
+        comment = _KEYWORD_COMMENTS.get(head)
+        if comment:
+            return comment
+
+        # C-style code writes the keyword without a space before the paren,
+        # so the token split above never isolates it
+        if line.startswith(('print(', 'print (')):
             return "Display output"
-        
-        # Imports
-        if re.match(r'^\s*import\s+', line):
-            return "Import module"
-        if re.match(r'^\s*from\s+.*import', line):
-            return "Import specific items"
-        
+        if line.startswith('if('):
+            return "Check condition"
+        if line.startswith(('for(', 'while(')):
+            return "Start loop iteration" if line[0] == 'f' else "Start conditional loop"
+
+        match = _ASSIGN_NAME_RE.match(line)
+        if match:
+            return f"Set {match.group(1)} variable"
         return ""
     
-    def explain_code(self, code: str, add_comments: bool = True) -> Dict[str, str]:
+    def explain_code(self, code: str, add_comments: bool = True, show_blocks: bool = False,
+                     language_hint: Optional[str] = None) -> Dict[str, str]:
         """Main method to explain code using Gemini API with minimal requests"""
-        language = self.detect_language(code)
+        # Trivial inputs aren't worth an API round trip — answer them from the
+        # rule-based path instantly
+        stripped = code.strip()
+        if not stripped or len(stripped) < 20:
+            language = self.detect_language_fallback(code)
+            return {
+                "language": language,
+                "overall_explanation": self.explain_code_block_simple(code, language),
+                "block_explanations": {},
+                "commented_code": self._generate_comments_rule_based(code, language) if add_comments else "",
+                "original_code": code,
+                "model_used": "rule-based (trivial input)"
+            }
+
+        # A caller-supplied language (e.g. from a bundled example) makes any
+        # detection work redundant; otherwise one round trip covers language +
+        # overall explanation, with the separate detection call only running
+        # if the structured reply can't be parsed
+        overall_explanation = None
+        if language_hint:
+            language = language_hint
+        else:
+            try:
+                combined = self.explain_and_detect_language(code)
+            except Exception:
+                combined = None
+            if combined:
+                language, overall_explanation = combined
+            else:
+                language = self.detect_language(code)
         
         # Limit code blocks to reduce API calls
         code_blocks = self.split_code_into_functions(code)
@@ -742,94 +946,106 @@ Add appropriate comments for important lines only. Keep comments short and use t
             "model_used": "Gemini 1.5 Flash"
         }
         
-        # Single API call for overall explanation
-        try:
-            results["overall_explanation"] = self.explain_code_with_gemini(code, language, is_full_code=True)
-        except Exception as e:
-            st.error(f"Error with Gemini API: {str(e)}")
-            results["overall_explanation"] = self.explain_code_block_simple(code, language)
-        
-        # Only explain blocks if there are multiple significant sections
-        if len(code_blocks) > 1 and len(code_blocks) <= 3:
-            for block_name, block_code in code_blocks:
-                if len(block_code.strip()) > 30:  # Only substantial blocks
+        # The overall explanation, per-block explanations and inline comments are
+        # independent network calls — run them concurrently so total wall time is
+        # the slowest call, not the sum of all of them
+        # At most three tasks are ever in flight (overall, batched blocks,
+        # comments), so three workers suffice
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            # When both the explanation and comments are still needed, one
+            # structured call covers them; otherwise submit only what's missing
+            overall_future = None
+            comments_future = None
+            combined_future = None
+            if overall_explanation is None and add_comments:
+                combined_future = executor.submit(self.explain_and_comment, code, language)
+            elif overall_explanation is None:
+                overall_future = executor.submit(self._explain_code_with_gemini_cached, code, language, True)
+            elif add_comments:
+                comments_future = executor.submit(self._generate_inline_comments_cached, code, language)
+
+            # Only explain blocks if there are multiple significant sections;
+            # all of them share one batched call instead of one call per block
+            blocks_future = None
+            significant_blocks = []
+            # Block explanations are only rendered when the checkbox is set —
+            # don't spend API calls computing output nobody sees
+            if show_blocks and len(code_blocks) > 1:
+                significant_blocks = [
+                    (block_name, block_code)
+                    for block_name, block_code in code_blocks
+                    if len(block_code.strip()) > 30  # Only substantial blocks
+                ]
+                # Soft cap per batch keeps the single-call latency predictable
+                significant_blocks = significant_blocks[:3]
+            if significant_blocks:
+                blocks_future = executor.submit(
+                    self.explain_blocks_batched, significant_blocks, language
+                )
+
+            # Fallbacks are applied here, outside every cached layer, and any
+            # degradation is recorded so downstream caches can refuse to pin
+            # a transient failure
+            degraded = False
+
+            if combined_future is not None:
+                combined_reply = None
+                try:
+                    combined_reply = combined_future.result()
+                except Exception:
+                    pass
+                if combined_reply:
+                    results["overall_explanation"], results["commented_code"] = combined_reply
+                else:
+                    # Structured reply didn't parse — fall back to the
+                    # individually cached two-call path
                     try:
-                        # Add delay to avoid rate limiting
-                        time.sleep(1)
-                        explanation = self.explain_code_with_gemini(block_code, language, is_full_code=False)
-                        results["block_explanations"][block_name] = explanation
-                    except Exception as e:
-                        # Use fallback for errors
+                        results["overall_explanation"] = self._explain_code_with_gemini_cached(code, language, True)
+                    except Exception:
+                        results["overall_explanation"] = self.explain_code_block_simple(code, language)
+                        degraded = True
+                    try:
+                        results["commented_code"] = self._generate_inline_comments_cached(code, language)
+                    except Exception:
+                        results["commented_code"] = self._generate_comments_rule_based(code, language)
+                        degraded = True
+            elif overall_future is None:
+                results["overall_explanation"] = overall_explanation
+            else:
+                try:
+                    results["overall_explanation"] = overall_future.result()
+                except Exception as e:
+                    st.error(f"Error with Gemini API: {str(e)}")
+                    results["overall_explanation"] = self.explain_code_block_simple(code, language)
+                    degraded = True
+
+            if blocks_future is not None:
+                try:
+                    results["block_explanations"], blocks_degraded = blocks_future.result()
+                    degraded = degraded or blocks_degraded
+                except Exception as e:
+                    # Use fallback for errors
+                    for block_name, block_code in significant_blocks:
                         results["block_explanations"][block_name] = self.explain_code_block_simple(block_code, language)
-        
-        # Add inline comments if requested (single API call)
-        if add_comments:
-            try:
-                time.sleep(1)  # Rate limiting
-                results["commented_code"] = self.generate_inline_comments(code, language)
-            except Exception as e:
-                results["commented_code"] = self._generate_comments_rule_based(code, language)
-        
+                    degraded = True
+
+            if comments_future is not None:
+                try:
+                    results["commented_code"] = comments_future.result()
+                except Exception as e:
+                    results["commented_code"] = self._generate_comments_rule_based(code, language)
+                    degraded = True
+
+        if degraded:
+            results["model_used"] = "Gemini 1.5 Flash (partial rule-based fallback)"
+
         return results
 
-# Streamlit App
-def main():
-    st.title("🤖 Advanced Code Explainer with Gemini AI")
-    st.markdown("Get detailed AI-powered code explanations using Google's Gemini API!")
-    
-    # Sidebar for configuration
-    st.sidebar.header("🔧 Configuration")
-    
-    # API Key status
-    
-    if gemini_api_key:
-        st.sidebar.success("✅ Gemini API Key loaded from environment")
-    else:
-        st.sidebar.error("❌ Gemini API Key not found in .env file")
-        st.error("Please add your GEMINI_API_KEY to the .env file")
-        return
-    
-    # Initialize explainer
-    try:
-        explainer = GeminiCodeExplainer()
-        st.sidebar.success("✅ Connected to Gemini API")
-        
-    except Exception as e:
-        st.sidebar.error(f"❌ Error: {str(e)}")
-        return
-    
-    # Options
-    add_comments = st.sidebar.checkbox("💬 Add inline comments", value=False)  # Default to False
-    show_block_explanations = st.sidebar.checkbox("📦 Show block-by-block explanations", value=False)  # Default to False
-    
-    # Rate limiting info
-    st.sidebar.info("⚠️ Using free Gemini API - limited requests per minute")
-    
-    # Language selection (optional override)
-    language_override = st.sidebar.selectbox(
-        "🔍 Language Override",
-        ["Auto-detect", "Python", "JavaScript", "Java", "C++"],
-        help="Leave as 'Auto-detect' for automatic language detection"
-    )
-    
-    # Main content area
-    col1, col2 = st.columns([1, 1])
-    
-    with col1:
-        st.subheader("📝 Input Code")
-        
-        # Code input
-        code_input = st.text_area(
-            "Paste your code here:",
-            height=400,
-            placeholder="def fibonacci(n):\n    if n <= 1:\n        return n\n    return fibonacci(n-1) + fibonacci(n-2)"
-        )
-        
-        # Example codes
-        st.markdown("### 📋 Example Codes")
-        examples = {
-            "Select an example": "",
-            "Python - Machine Learning": '''import numpy as np
+# Example snippets shown in the UI, keyed name -> (language, code) — built
+# once at import, and the authored language skips detection entirely
+_EXAMPLES = {
+    "Select an example": ("", ""),
+    "Python - Machine Learning": ("python", '''import numpy as np
 from sklearn.model_selection import train_test_split
 from sklearn.linear_model import LogisticRegression
 from sklearn.metrics import accuracy_score
@@ -849,9 +1065,9 @@ def train_model(X, y):
 X = np.random.randn(1000, 4)
 y = np.random.randint(0, 2, 1000)
 model, acc = train_model(X, y)
-print(f"Model accuracy: {acc:.2f}")''',
-            
-            "Python - Data Analysis": '''import pandas as pd
+print(f"Model accuracy: {acc:.2f}")'''),
+
+    "Python - Data Analysis": ("python", '''import pandas as pd
 import matplotlib.pyplot as plt
 
 def analyze_sales_data(csv_file):
@@ -881,9 +1097,9 @@ def get_sales_stats(df):
         'total_sales': df['sales'].sum(),
         'avg_sales': df['sales'].mean(),
         'best_month': df['sales'].idxmax()
-    }''',
-            
-            "JavaScript - Web App": '''class TaskManager {
+    }'''),
+
+    "JavaScript - Web App": ("javascript", '''class TaskManager {
     constructor() {
         this.tasks = [];
         this.nextId = 1;
@@ -930,25 +1146,138 @@ def get_sales_stats(df):
     }
 }
 
-const taskManager = new TaskManager();'''
-        }
+const taskManager = new TaskManager();''')
+}
+
+
+
+@st.cache_data(show_spinner=False)
+def _build_report(report_key: str, ts: str, _results) -> str:
+    """Assemble the markdown report once per (results, minute) combination."""
+    results = _results
+    buf = io.StringIO()
+    buf.write(f"""# Code Analysis Report
+Generated by: {results['model_used']}
+Language: {results['language'].title()}
+Date: {ts}
+
+## 📖 Detailed Explanation
+{results['overall_explanation']}
+
+## 🔧 Block-by-Block Analysis
+""")
+
+    for block_name, explanation in results['block_explanations'].items():
+        buf.write(f"""
+### {block_name}
+{explanation}
+""")
+
+    if results['commented_code']:
+        buf.write(f"""
+## 💬 Code with Comments
+```{results['language']}
+{results['commented_code']}
+```
+""")
+
+    buf.write(f"""
+## 📄 Original Code
+```{results['language']}
+{results['original_code']}
+```
+""")
+
+    return buf.getvalue()
+
+
+# Streamlit App
+def main():
+    st.title("🤖 Advanced Code Explainer with Gemini AI")
+    st.markdown("Get detailed AI-powered code explanations using Google's Gemini API!")
+    
+    # Sidebar for configuration
+    st.sidebar.header("🔧 Configuration")
+    
+    # API Key status
+    
+    if gemini_api_key:
+        st.sidebar.success("✅ Gemini API Key loaded from environment")
+    else:
+        st.sidebar.error("❌ Gemini API Key not found in .env file")
+        st.error("Please add your GEMINI_API_KEY to the .env file")
+        return
+    
+    # Initialize explainer
+    try:
+        explainer = GeminiCodeExplainer()
+        st.sidebar.success("✅ Connected to Gemini API")
         
-        example_choice = st.selectbox("Choose an example:", list(examples.keys()))
+    except Exception as e:
+        st.sidebar.error(f"❌ Error: {str(e)}")
+        return
+    
+    # Options
+    add_comments = st.sidebar.checkbox("💬 Add inline comments", value=False)  # Default to False
+    show_block_explanations = st.sidebar.checkbox("📦 Show block-by-block explanations", value=False)  # Default to False
+    
+    # Rate limiting info
+    st.sidebar.info("⚠️ Using free Gemini API - limited requests per minute")
+    
+    # Language selection (optional override)
+    language_override = st.sidebar.selectbox(
+        "🔍 Language Override",
+        ["Auto-detect", "Python", "JavaScript", "Java", "C++"],
+        help="Leave as 'Auto-detect' for automatic language detection"
+    )
+    
+    # Main content area
+    col1, col2 = st.columns([1, 1])
+    
+    with col1:
+        st.subheader("📝 Input Code")
         
-        if example_choice != "Select an example":
-            code_input = st.text_area(
-                "Example Code:",
-                value=examples[example_choice],
-                height=300,
-                key="example_code"
-            )
+        def _load_example():
+            choice = st.session_state.example_choice
+            if choice != "Select an example":
+                language, code = _EXAMPLES[choice]
+                st.session_state.code_input = code
+                st.session_state.language_hint = language
+        
+        def _clear_language_hint():
+            # Hand-edited code may no longer be the example's language
+            st.session_state.language_hint = None
+        
+        # One text area backed by session state; picking an example loads it
+        # into the same widget instead of rendering a second one
+        st.session_state.setdefault("code_input", "")
+        code_input = st.text_area(
+            "Paste your code here:",
+            height=400,
+            placeholder="def fibonacci(n):\n    if n <= 1:\n        return n\n    return fibonacci(n-1) + fibonacci(n-2)",
+            key="code_input",
+            on_change=_clear_language_hint
+        )
+        
+        # Example codes
+        st.markdown("### 📋 Example Codes")
+        
+        st.selectbox(
+            "Choose an example:",
+            list(_EXAMPLES),
+            key="example_choice",
+            on_change=_load_example,
+        )
         
         # Analyze button
         if st.button("🔍 Analyze Code", type="primary"):
             if code_input.strip():
                 with st.spinner("🤖 Gemini is analyzing your code..."):
                     try:
-                        results = explainer.explain_code(code_input, add_comments)
+                        results = explainer.explain_code(
+                            code_input, add_comments, show_block_explanations,
+                            language_hint=st.session_state.get("language_hint"),
+                        )
                         st.session_state.results = results
                         st.success("✅ Analysis complete!")
                     except Exception as e:
@@ -991,38 +1320,16 @@ const taskManager = new TaskManager();'''
             # Download options
             st.subheader("📥 Download Results")
             
-            # Prepare comprehensive download content
-            download_content = f"""# Code Analysis Report
-Generated by: {results['model_used']}
-Language: {results['language'].title()}
-Date: {time.strftime('%Y-%m-%d %H:%M:%S')}
-
-## 📖 Detailed Explanation
-{results['overall_explanation']}
-
-## 🔧 Block-by-Block Analysis
-"""
-            
-            for block_name, explanation in results['block_explanations'].items():
-                download_content += f"""
-### {block_name}
-{explanation}
-"""
-            
-            if results['commented_code']:
-                download_content += f"""
-## 💬 Code with Comments
-```{results['language']}
-{results['commented_code']}
-```
-"""
-            
-            download_content += f"""
-## 📄 Original Code
-```{results['language']}
-{results['original_code']}
-```
-"""
+            # The report is cached on a fingerprint of the full results plus
+            # a minute-granular timestamp, so sidebar toggles and other reruns
+            # don't rebuild the multi-KB markdown
+            report_key = hashlib.blake2b(
+                json.dumps(results, sort_keys=True).encode(),
+                digest_size=16,
+            ).hexdigest()
+            download_content = _build_report(
+                report_key, time.strftime('%Y-%m-%d %H:%M'), results
+            )
             
             st.download_button(
                 label="📄 Download Complete Analysis",